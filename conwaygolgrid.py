@@ -1,19 +1,37 @@
 """Grid object"""
-from copy import copy
-from collections import namedtuple, deque
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 import pygame as pg
 import numpy as np
-from numba import njit
-from cv2 import GaussianBlur, blur
-
-
-NUMBA_EMPTY_PLACEHOLDER = (-99, -99)
-
-Settings = namedtuple("Settings", ["background_color", "grid_color", "new_color",
-                                   "survivor_color", "dead_color", "cells", "neighbour_count",
-                                   "new_cells", "survivor_cells", "survivor_duration", "dead_cells",
-                                   "iteration", "prepared_cells"])
+from numba import njit, prange
+from cv2 import getGaussianKernel, sepFilter2D
+
+
+CELLS_PER_WORD = 64
+ROWS_PER_TILE = 16
+MAX_CACHED_BLOOM_CELLS = 64
+MAX_SURVIVOR_DURATION = np.iinfo(np.uint16).max
+# Above this fraction of cells to redraw, repainting all cells at once is the faster option
+REPAINT_FRACTION = 0.05
+BLOOM_SIGMA = 10
+
+StateDiff = namedtuple("StateDiff", ["indices", "words"])
+
+@dataclass(slots=True)
+class Settings:
+    """A backup of the grid, holding its colors, its state and the iteration"""
+    background_color: tuple[int, int, int]
+    grid_color: tuple[int, int, int]
+    new_color: tuple[int, int, int]
+    survivor_color: tuple[int, int, int]
+    dead_color: tuple[int, int, int]
+    state: np.ndarray | StateDiff
+    iteration: int
+
+PackedCells = namedtuple("PackedCells", ["words", "spare_words", "active_tiles"])
 CellSizeSettings = namedtuple("CellSizeSettings", ["cell_rect", "gaussian_ksize", "blur_ksize"])
 
 class CellSize(Enum):
@@ -37,6 +55,8 @@ class ConwayGoLGrid():
         CellSize.L: CellSizeSettings((4, 4, 12, 12), (7, 7), (5, 5)),
         CellSize.XL: CellSizeSettings((7, 7, 26, 26), (15, 15), (5, 5))
     }
+    __bloom_cache: OrderedDict[tuple[CellSize, tuple[int, int, int]], pg.Surface] = OrderedDict()
+    __update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grid-update")
 
     def __init__(self, cell_size: CellSize, width: int, height: int, surface: pg.Surface,
                  background_color: tuple[int, int, int], grid_color: tuple[int, int, int],
@@ -52,17 +72,27 @@ class ConwayGoLGrid():
         self.__survivor_color = survivor_color
         self.__dead_color = dead_color
         self.__gridlines_visible = False
+        self.__gridlines: pg.Surface | None = None
+        self.__dirty_rect: pg.Rect | None = None
 
         self.__cells: np.ndarray = np.ndarray([])
-        self.__neighbour_count: np.ndarray = np.ndarray([])
-        self.__new_cells: set[tuple[(int, int)]] = set()
-        self.__survivor_cells: set[tuple[(int, int)]] = set()
-        self.__survivor_duration: dict[tuple[int, int], int] = {}
-        self.__dead_cells: set[tuple[(int, int)]] = set()
+        self.__new_cells: np.ndarray = np.ndarray([])
+        self.__survivor_cells: np.ndarray = np.ndarray([])
+        self.__survivor_duration: np.ndarray = np.ndarray([])
+        self.__dead_cells: np.ndarray = np.ndarray([])
+        self.__x_coordinates: np.ndarray = np.ndarray([])
+        self.__y_coordinates: np.ndarray = np.ndarray([])
+        self.__cell_image: pg.Surface
+        self.__cell_area: pg.Surface
         self.__iteration: int = 0
+        self.__alive_count: int = 0
         self.__backups = deque(maxlen=max_backups)
+        self.__state_version: int = 0
+        self.__next_update: tuple[int, Future] | None = None
+        self.__packed_cells: PackedCells | None = None
         self.__cell_size_settings: CellSizeSettings
         self.__prepared_cells: dict[tuple[int, int, int], pg.Surface]
+        self.__solid_cells: dict[tuple[int, int, int], pg.Surface]
         self.reset()
 
     @property
@@ -83,18 +113,23 @@ class ConwayGoLGrid():
     @property
     def alive_count(self) -> int:
         """The amount of alive cells in the grid"""
-        return np.count_nonzero(self.__cells)
+        return self.__alive_count
 
     @property
     def alive_percentage(self) -> float:
         """The amount of alive cells in the grid"""
-        return np.count_nonzero(self.__cells) / self.__cells.size * 100
+        return self.__alive_count / self.__cells.size * 100
 
     @property
     def surface(self) -> pg.Surface:
         """The surface the game is drawn onto"""
         return self.__surface
 
+    def take_dirty_rect(self) -> pg.Rect | None:
+        """The area of the surface that was drawn onto since the previous call, if any"""
+        dirty_rect, self.__dirty_rect = self.__dirty_rect, None
+        return dirty_rect
+
     @staticmethod
     def new(cell_size: CellSize, width: int, height: int, screen: pg.Surface,
             background_color: tuple[int, int, int], grid_color: tuple[int, int, int],
@@ -110,128 +145,248 @@ class ConwayGoLGrid():
     def update(self) -> None:
         """Updates the grid to the next step in the iteration, following Conway's Game
         of Life rules. Evaluates the grid, and redraws all changed cells"""
+        # An empty grid with nothing left to fade out stays the same, so there's no need
+        # to evaluate it, nor to keep a backup of it
+        if self.__alive_count == 0 and not self.__dead_cells.any():
+            return
+
+        next_update = self.__take_next_update()
+        packed_cells = self.__packed_cells
         self.__store_state()
-        (updated_cells,
-         cells_to_redraw) = ConwayGoLGrid.__perform_update(self.__cells, self.__neighbour_count,
-                                                           self.__new_cells, self.__survivor_cells,
-                                                           self.__dead_cells, self.__new_color,
-                                                           self.__survivor_color, self.__dead_color,
-                                                           self.__background_color)
+        (updated_cells, new_cells, survivor_cells, dead_cells,
+         self.__packed_cells) = next_update or ConwayGoLGrid.__perform_update(self.__cells,
+                                                                             packed_cells)
+        # Cells that were dead in the previous iteration and did not come back to life fade out
+        faded_cells = self.__dead_cells & ~new_cells
+        # Survivors that already survived the previous iteration are drawn as such already,
+        # new and dead cells always changed state
+        previous_survivor_cells = self.__survivor_cells
+        promoted_cells = survivor_cells & ~previous_survivor_cells
         self.__cells = updated_cells
-        self.__update_survivor_duration()
+        self.__new_cells = new_cells
+        self.__survivor_cells = survivor_cells
+        self.__dead_cells = dead_cells
+        new_count, dead_count = int(np.count_nonzero(new_cells)), int(np.count_nonzero(dead_cells))
+        self.__alive_count += new_count - dead_count
+        self.__update_survivor_duration(previous_survivor_cells)
         self.__iteration += 1
-        self.__draw_cells(cells_to_redraw, self.__gridlines_visible)
+
+        redraw_count = (new_count + dead_count + int(np.count_nonzero(promoted_cells))
+                        + int(np.count_nonzero(faded_cells)))
+        if (self.__cell_size in {CellSize.XS, CellSize.S}
+            and redraw_count > REPAINT_FRACTION * self.__cells.size):
+            self.__draw_grid()
+        else:
+            self.__draw_new_cells(False)
+            self.__draw_cells(*np.nonzero(promoted_cells), self.__survivor_color, False)
+            self.__draw_dead_cells(False)
+            self.__draw_cells(*np.nonzero(faded_cells), self.__background_color,
+                              self.__gridlines_visible)
+        # Already work out the next iteration in the background, while the game handles
+        # events and waits for the next frame. It gets a copy of the cells of its own, since
+        # changes made to the grid in the meantime write into them
+        self.__next_update = (self.__state_version,
+                              ConwayGoLGrid.__update_executor.submit(
+                                  ConwayGoLGrid.__perform_update, self.__cells.copy(),
+                                  self.__packed_cells))
+
+    def __take_next_update(self) -> tuple[np.ndarray, ...] | None:
+        """Return the iteration worked out in the background, if the grid has not changed
+        since it was started. Always waits for it to finish, so that no two updates run
+        at the same time"""
+        if self.__next_update is None:
+            return None
+
+        state_version, future = self.__next_update
+        self.__next_update = None
+        next_update = future.result()
+        return next_update if state_version == self.__state_version else None
+
+    @staticmethod
+    def perform_update(cells: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Works out the next iteration of the given cells from scratch, without touching any
+        grid. Returns the updated cells, and the masks of the new, survivor and dead cells"""
+        return ConwayGoLGrid.__perform_update(cells)[:4]
 
     @staticmethod
-    @njit(fastmath=True, cache=True)
-    def __perform_update(cells: np.ndarray, neighbour_count: np.ndarray,
-                         new_cells: set[tuple[int, int]], survivor_cells: set[tuple[int, int]],
-                         dead_cells: set[tuple[int, int]], new_color: tuple[int, int, int],
-                         survivor_color: tuple[int, int, int], dead_color: tuple[int, int, int],
-                         background_color: tuple[int, int, int]
-                         ) -> tuple[np.ndarray, list[tuple[int, int, tuple[int, int, int]]]]:
+    def __perform_update(cells: np.ndarray, packed_cells: PackedCells | None = None
+                         ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, PackedCells]:
         """Updates the grid to the next step in the iteration, following Conway's Game of Life
-        rules. Evaluates each cell, and returns the list of cells to be redrawn and their colors
+        rules. The grid is packed into 64-bit words, one bit per cell, so the rules can be
+        applied to 64 cells at once. The packed grid of the previous update can be passed on,
+        so it does not need packing again and only its active tiles are evaluated. Returns the
+        updated grid, the masks of the new, survivor and dead cells, and the packed grid to
+        pass on to the next update
         """
         rows, columns = cells.shape
-        # Grab the coordinates of the non-background cells
-        active_cells = sorted(new_cells.union(survivor_cells).union(dead_cells))
-
-        # Per active cell, grab the coordinates from surrounding cells, add them to a set
-        # to be able to evaluate each cell once.
-        cells_to_evaluate = set([(i, j) for row, col in active_cells
-                                        for i in range(max(0, row-1), min(row+2, rows))
-                                            for j in range(max(0, col-1), min(col+2, columns))])
-
-        updated_cells = np.array([[False] * cells.shape[1]] * cells.shape[0])
-        neighbour_count_to_update: list[tuple[tuple[int, int], int]] = []
-        cells_to_redraw: list[tuple[int, int, tuple[int, int, int]]] = []
-        for row, col in cells_to_evaluate:
-            cell = (row, col)
-            # Count the alive cells around the current cell
-            alive_neighbours = neighbour_count[row, col]
-            if cells[cell]:
-                if alive_neighbours in (2, 3):
-                    updated_cells[cell] = True
-                    cells_to_redraw.append((row, col, survivor_color))
-                    survivor_cells.add(cell)
-                    new_cells.discard(cell)
-                    dead_cells.discard(cell)
-                else:
-                    cells_to_redraw.append((row, col, dead_color))
-                    neighbour_count_to_update.append((cell, -1))
-                    dead_cells.add(cell)
-                    new_cells.discard(cell)
-                    survivor_cells.discard(cell)
-            else:
-                if alive_neighbours == 3:
-                    updated_cells[cell] = True
-                    cells_to_redraw.append((row, col, new_color))
-                    neighbour_count_to_update.append((cell, 1))
-                    new_cells.add(cell)
-                    survivor_cells.discard(cell)
-                    dead_cells.discard(cell)
-                else:
-                    if cell in dead_cells:
-                        cells_to_redraw.append((row, col, background_color))
-                        dead_cells.discard(cell)
-
-        for coordinates, delta in neighbour_count_to_update:
-            row, col = coordinates
-            for i in range(max(0, row-1), min(row+2, rows)):
-                for j in range(max(0, col-1), min(col+2, columns)):
-                    if (i, j) != coordinates:
-                        neighbour_count[(i, j)] += delta
-
-        return updated_cells, cells_to_redraw
+        words = -(-columns // CELLS_PER_WORD)
+        if packed_cells is None:
+            packed_bytes = np.zeros((rows, words * 8), dtype=np.uint8)
+            packed_bytes[:, :-(-columns // 8)] = np.packbits(cells, axis=1, bitorder="little")
+            packed_cells = PackedCells(packed_bytes.view(np.uint64),
+                                       np.empty((rows, words), dtype=np.uint64),
+                                       np.ones((-(-rows // ROWS_PER_TILE), words), dtype=bool))
+        # Bits past the last column must stay empty, or they would feed back into the grid
+        last_word_mask = np.uint64(2**(columns - (words - 1) * CELLS_PER_WORD) - 1)
+        # The spare words are written into, and swap places with the current words afterwards
+        updated_words = packed_cells.spare_words
+        active_tiles = ConwayGoLGrid.__perform_packed_update(
+            packed_cells.words, updated_words, last_word_mask, packed_cells.active_tiles)
+        updated_cells = np.unpackbits(updated_words.view(np.uint8), axis=1, count=columns,
+                                      bitorder="little")
+
+        alive = cells.view(bool)
+        updated_alive = updated_cells.view(bool)
+        new_cells = updated_alive & ~alive
+        survivor_cells = updated_alive & alive
+        dead_cells = alive & ~updated_alive
+        packed_cells = PackedCells(updated_words, packed_cells.words, active_tiles)
+        return updated_cells, new_cells, survivor_cells, dead_cells, packed_cells
+
+    @staticmethod
+    @njit("boolean[:, ::1](uint64[:, ::1], uint64[:, ::1], uint64, boolean[:, ::1])",
+          parallel=True, cache=True, nogil=True, boundscheck=False, error_model="numpy")
+    def __perform_packed_update(words: np.ndarray, updated_words: np.ndarray,
+                                last_word_mask: np.uint64, active_tiles: np.ndarray
+                                ) -> np.ndarray:
+        """Applies Conway's Game of Life rules to a grid packed into 64-bit words, writing the
+        result into the updated words. The eight neighbours of every cell are added up with
+        bitwise full adders, which yields the neighbour count of 64 cells at once, spread over
+        a ones-bit and a twos-count.
+        The grid is split into tiles of one word wide. A tile in which nothing changed, with
+        no changes in the surrounding tiles either, can not change in this iteration, so it
+        is skipped. The updated words hold the grid from before the previous iteration,
+        which is the same as the current grid in those tiles. Returns the tiles to evaluate
+        in the next iteration"""
+        rows, columns = words.shape
+        tile_rows = active_tiles.shape[0]
+        zero, one, last_bit = np.uint64(0), np.uint64(1), np.uint64(CELLS_PER_WORD - 1)
+        changed_tiles = np.zeros_like(active_tiles)
+        for row in prange(rows):
+            tile_row = row // ROWS_PER_TILE
+            for col in range(columns):
+                if not active_tiles[tile_row, col]:
+                    continue
+                # West and east neighbours are the words shifted by a bit, carrying in
+                # the edge bit of the adjacent word
+                above_west = above = above_east = zero
+                below_west = below = below_east = zero
+                if row > 0:
+                    above = words[row-1, col]
+                    above_west = above << one
+                    above_east = above >> one
+                    if col > 0:
+                        above_west |= words[row-1, col-1] >> last_bit
+                    if col < columns - 1:
+                        above_east |= words[row-1, col+1] << last_bit
+                if row < rows - 1:
+                    below = words[row+1, col]
+                    below_west = below << one
+                    below_east = below >> one
+                    if col > 0:
+                        below_west |= words[row+1, col-1] >> last_bit
+                    if col < columns - 1:
+                        below_east |= words[row+1, col+1] << last_bit
+                current = words[row, col]
+                west = current << one
+                east = current >> one
+                if col > 0:
+                    west |= words[row, col-1] >> last_bit
+                if col < columns - 1:
+                    east |= words[row, col+1] << last_bit
+
+                # Add up the neighbours per row: the rows above and below through a full
+                # adder, the current row (without the cell itself) through a half adder
+                above_ones = above_west ^ above ^ above_east
+                above_twos = (above_west & above) | (above_east & (above_west ^ above))
+                below_ones = below_west ^ below ^ below_east
+                below_twos = (below_west & below) | (below_east & (below_west ^ below))
+                current_ones = west ^ east
+                current_twos = west & east
+                # Add up the row sums: the ones bit is final, the twos are counted further
+                ones = above_ones ^ below_ones ^ current_ones
+                ones_carry = ((above_ones & below_ones)
+                              | (current_ones & (above_ones ^ below_ones)))
+                twos = above_twos ^ below_twos ^ current_twos
+                fours = ((above_twos & below_twos)
+                         | (current_twos & (above_twos ^ below_twos)))
+                # Exactly 2 or 3 neighbours means a single two and no four. A cell with
+                # 3 neighbours lives on or is born, one with 2 neighbours only lives on
+                exactly_one_two = (twos ^ ones_carry) & ~fours
+                updated = exactly_one_two & (ones | current)
+                if col == columns - 1:
+                    updated &= last_word_mask
+                updated_words[row, col] = updated
+                if updated != current:
+                    changed_tiles[tile_row, col] = True
+
+        # A change on the edge of a tile affects the cells in the surrounding tiles
+        next_active_tiles = np.zeros_like(active_tiles)
+        for tile_row in range(tile_rows):
+            for col in range(columns):
+                if changed_tiles[tile_row, col]:
+                    # Written out as loops, a slice assignment becomes a parallel region of
+                    # its own when compiled with parallel=True
+                    for next_row in range(max(tile_row-1, 0), min(tile_row+2, tile_rows)):
+                        for next_col in range(max(col-1, 0), min(col+2, columns)):
+                            next_active_tiles[next_row, next_col] = True
+        return next_active_tiles
 
     def reset(self) -> None:
         """Resets the entire grid"""
-        self.__cells = np.full((self.__height // self.__cell_size.value,
-                                self.__width // self.__cell_size.value),
-                               False, dtype=bool)
-        self.__neighbour_count = np.zeros(self.__cells.shape, dtype=int)
-        # The initial entry NUMBA_EMPTY_PLACEHOLDER is added since Numba can not handle empty sets
-        self.__new_cells = set([NUMBA_EMPTY_PLACEHOLDER])
-        self.__survivor_cells = set([NUMBA_EMPTY_PLACEHOLDER])
-        self.__survivor_duration = {}
-        self.__dead_cells = set([NUMBA_EMPTY_PLACEHOLDER])
+        self.__cells = np.zeros((self.__height // self.__cell_size.value,
+                                 self.__width // self.__cell_size.value), dtype=np.uint8)
+        self.__new_cells = np.zeros(self.__cells.shape, dtype=bool)
+        self.__survivor_cells = np.zeros(self.__cells.shape, dtype=bool)
+        self.__survivor_duration = np.zeros(self.__cells.shape, dtype=np.uint16)
+        self.__dead_cells = np.zeros(self.__cells.shape, dtype=bool)
+        rows, columns = self.__cells.shape
+        # Pixel coordinates of each row and column, so they don't need computing on every draw
+        self.__x_coordinates = np.arange(columns, dtype=np.int32) * self.__cell_size.value
+        self.__y_coordinates = np.arange(rows, dtype=np.int32) * self.__cell_size.value
+        # An image holding a single pixel per cell, and the part of the surface covered by cells
+        self.__cell_image = pg.Surface((columns, rows), 0, self.__surface)
+        self.__cell_area = self.__surface.subsurface((0, 0, columns * self.__cell_size.value,
+                                                      rows * self.__cell_size.value))
         self.__iteration = 0
+        self.__alive_count = 0
         self.__backups = deque(maxlen=self.__backups.maxlen)
+        self.__state_version += 1
+        self.__packed_cells = None
         self.__cell_size_settings = ConwayGoLGrid.cell_size_settings[self.__cell_size]
+        self.__gridlines = None
         self.__prepare_cells()
         self.__draw_grid()
 
     def resurrect_cell(self, coordinates: tuple[int, int]) -> None:
         """Brings a cell in the grid to life"""
-        if (coordinates in self.__new_cells or coordinates in self.__survivor_cells
-            or coordinates == NUMBA_EMPTY_PLACEHOLDER):
+        if self.__cells[coordinates]:
             return
 
         self.__store_state()
         self.__cells[coordinates] = True
-        self.__update_neighbour_count(coordinates)
-        self.__new_cells.add(coordinates)
-        self.__dead_cells.discard(coordinates)
-        self.__draw_cells([(coordinates[0], coordinates[1], self.__new_color)],
+        self.__new_cells[coordinates] = True
+        self.__dead_cells[coordinates] = False
+        self.__alive_count += 1
+        row, col = coordinates
+        self.__draw_cells(np.array([row]), np.array([col]), self.__new_color,
                           self.__gridlines_visible)
 
     def clear_cell(self, coordinates: tuple[int, int]) -> None:
         """Clears a cell from the grid"""
-        if coordinates == NUMBA_EMPTY_PLACEHOLDER:
+        if not self.__cells[coordinates] and not self.__dead_cells[coordinates]:
             return
 
         self.__store_state()
-        if self.__cells[coordinates]:
-            self.__cells[coordinates] = False
-            self.__update_neighbour_count(coordinates)
-
-        self.__new_cells.discard(coordinates)
-        self.__survivor_cells.discard(coordinates)
-        self.__survivor_duration.pop(coordinates, None)
-        self.__dead_cells.discard(coordinates)
-
-        self.__draw_cells([(coordinates[0], coordinates[1], self.__background_color)],
+        self.__alive_count -= int(self.__cells[coordinates])
+        self.__cells[coordinates] = False
+        self.__new_cells[coordinates] = False
+        self.__survivor_cells[coordinates] = False
+        self.__survivor_duration[coordinates] = 0
+        self.__dead_cells[coordinates] = False
+
+        row, col = coordinates
+        self.__draw_cells(np.array([row]), np.array([col]), self.__background_color,
                           self.__gridlines_visible)
 
     def create_cell_layout(self, cells: np.ndarray) ->  None:
@@ -240,13 +395,12 @@ class ConwayGoLGrid():
             return
 
         self.__store_state()
-        self.__cells = cells
-        self.__neighbour_count = ConwayGoLGrid.__create_neighbour_count(self.__cells)
-        self.__new_cells = set(map(tuple, np.transpose((self.__cells).nonzero())))
-        self.__new_cells.add(NUMBA_EMPTY_PLACEHOLDER)
-        self.__survivor_cells = set([NUMBA_EMPTY_PLACEHOLDER])
-        self.__survivor_duration = {}
-        self.__dead_cells = set([NUMBA_EMPTY_PLACEHOLDER])
+        self.__new_cells = np.array(cells, dtype=bool, order="C")
+        self.__cells = self.__new_cells.view(np.uint8).copy()
+        self.__survivor_cells = np.zeros(self.__cells.shape, dtype=bool)
+        self.__survivor_duration = np.zeros(self.__cells.shape, dtype=np.uint16)
+        self.__dead_cells = np.zeros(self.__cells.shape, dtype=bool)
+        self.__alive_count = int(np.count_nonzero(self.__cells))
         self.__iteration = 0
         self.__draw_grid()
 
@@ -256,18 +410,13 @@ class ConwayGoLGrid():
             return
 
         self.__store_state()
-        self.__cells = np.logical_or(self.__cells, new_cells)
-        self.__new_cells = set(map(tuple, np.transpose((self.__cells).nonzero())))
-        self.__new_cells.add(NUMBA_EMPTY_PLACEHOLDER)
-        self.__survivor_cells.difference_update(self.__new_cells)
-        self.__survivor_cells.add(NUMBA_EMPTY_PLACEHOLDER)
-        self.__dead_cells.difference_update(self.__new_cells)
-        self.__dead_cells.add(NUMBA_EMPTY_PLACEHOLDER)
-        _ = [self.__survivor_duration.pop((row, col), None)
-                for row, col in list(self.__survivor_duration.keys())
-                    if (row, col) in self.__new_cells]
-
-        self.__neighbour_count = ConwayGoLGrid.__create_neighbour_count(self.__cells)
+        new_cells = np.ascontiguousarray(new_cells, dtype=bool)
+        self.__cells |= new_cells
+        self.__new_cells |= new_cells
+        self.__survivor_cells &= ~new_cells
+        self.__dead_cells &= ~new_cells
+        self.__survivor_duration[new_cells] = 0
+        self.__alive_count = int(np.count_nonzero(self.__cells))
 
         if redraw:
             self.__draw_grid()
@@ -275,41 +424,30 @@ class ConwayGoLGrid():
     def wipe_survivors(self) -> None:
         """Wipe all survivor cells off the grid"""
         self.__store_state()
-        for cell in self.__survivor_cells:
-            if cell != NUMBA_EMPTY_PLACEHOLDER:
-                self.__cells[cell] = False
-                self.__update_neighbour_count(cell)
-        self.__survivor_cells = set([NUMBA_EMPTY_PLACEHOLDER])
-        self.__survivor_duration = {}
+        self.__cells[self.__survivor_cells] = False
+        self.__alive_count -= int(np.count_nonzero(self.__survivor_cells))
+        self.__survivor_cells = np.zeros(self.__cells.shape, dtype=bool)
+        self.__survivor_duration = np.zeros(self.__cells.shape, dtype=np.uint16)
         self.__draw_grid()
 
     def purge_survivors(self, purge_trigger: int) -> None:
         """Purge all survivor cells that have not updated their status for the given
         number of iterations. Basically, kill off the stragglers"""
         self.__store_state()
-        for cell in list(self.__survivor_duration.keys()):
-            if self.__survivor_duration[cell] >= purge_trigger:
-                self.__survivor_duration.pop(cell, None)
-                if cell != NUMBA_EMPTY_PLACEHOLDER:
-                    self.__cells[cell] = False
-                self.__update_neighbour_count(cell)
-                # We don't want to remove the NUMBA_EMPTY_PLACEHOLDER entry, or Numba will cry ;-)
-                if cell != NUMBA_EMPTY_PLACEHOLDER:
-                    self.__survivor_cells.discard(cell)
+        purged_cells = self.__survivor_cells & (self.__survivor_duration >= purge_trigger)
+        self.__cells[purged_cells] = False
+        self.__alive_count -= int(np.count_nonzero(purged_cells))
+        self.__survivor_cells[purged_cells] = False
+        self.__survivor_duration[purged_cells] = 0
         self.__draw_grid()
 
     def invert(self) ->  None:
         """Turns all new cells into dead cells and vice versa"""
         self.__store_state()
         self.__new_cells, self.__dead_cells = self.__dead_cells, self.__new_cells
-        for cell in self.__new_cells:
-            if cell != NUMBA_EMPTY_PLACEHOLDER:
-                self.__cells[cell] = True
-                self.__update_neighbour_count(cell)
-        for cell in self.__dead_cells:
-            if cell != NUMBA_EMPTY_PLACEHOLDER:
-                self.__cells[cell] = False
-                self.__update_neighbour_count(cell)
+        self.__cells[self.__new_cells] = True
+        self.__cells[self.__dead_cells] = False
+        self.__alive_count = int(np.count_nonzero(self.__cells))
         self.__draw_grid()
 
     def change_cell_size(self, value: CellSize):
@@ -324,38 +462,45 @@ class ConwayGoLGrid():
             return
 
         backup: Settings = self.__backups.pop()
+        self.__state_version += 1
+        self.__packed_cells = None
+        if len(self.__backups) > 0:
+            # The previous backup now becomes the most recent one, so restore it in full
+            previous = self.__backups[-1]
+            previous_state = backup.state.copy()
+            previous_state.view(np.uint64)[previous.state.indices] ^= previous.state.words
+            previous.state = previous_state
+
         self.__background_color = backup.background_color
-        self.__grid_color = backup.grid_color
+        if self.__grid_color != backup.grid_color:
+            self.__grid_color = backup.grid_color
+            self.__gridlines = None
         self.__new_color = backup.new_color
         self.__survivor_color = backup.survivor_color
         self.__dead_color = backup.dead_color
-        self.__cells = copy(backup.cells)
-        self.__neighbour_count = copy(backup.neighbour_count)
-        self.__new_cells = copy(backup.new_cells)
-        self.__survivor_cells = copy(backup.survivor_cells)
-        self.__survivor_duration = copy(backup.survivor_duration)
-        self.__dead_cells = copy(backup.dead_cells)
+        self.__unpack_state(backup.state)
+        self.__alive_count = int(np.count_nonzero(self.__cells))
         self.__iteration = backup.iteration
-        self.__prepared_cells = backup.prepared_cells
+        self.__prepare_cells()
         self.__draw_grid()
 
     def change_new_color(self, color: tuple[int, int, int]):
         """Changes the color of a new cell"""
-        self.__store_state()
+        self.__store_state(cells_changed=False)
         self.__new_color = color
         self.__prepare_cells()
         self.__draw_new_cells(self.__gridlines_visible)
 
     def change_survivor_color(self, color: tuple[int, int, int]):
         """Changes the color of a survivor cell"""
-        self.__store_state()
+        self.__store_state(cells_changed=False)
         self.__survivor_color = color
         self.__prepare_cells()
         self.__draw_survivor_cells(self.__gridlines_visible)
 
     def change_dead_color(self, color: tuple[int, int, int]):
         """Changes the color of a dead cell"""
-        self.__store_state()
+        self.__store_state(cells_changed=False)
         self.__dead_color = color
         self.__prepare_cells()
         self.__draw_dead_cells(self.__gridlines_visible)
@@ -364,7 +509,7 @@ class ConwayGoLGrid():
                                               tuple[int, int, int],
                                               tuple[int, int, int]]):
         """Changes the color of all cells"""
-        self.__store_state()
+        self.__store_state(cells_changed=False)
         self.__new_color = colors[0]
         self.__survivor_color = colors[1]
         self.__dead_color = colors[2]
@@ -376,76 +521,93 @@ class ConwayGoLGrid():
         self.__gridlines_visible = not self.__gridlines_visible
         self.__draw_grid()
 
-    @staticmethod
-    @njit(fastmath=True, cache=True)
-    def __create_neighbour_count(cells: np.ndarray) -> np.ndarray:
-        """Create the neighbour count for all cells in the grid"""
-        (rows, columns) = cells.shape
-        neighbour_count = np.array([[0] * columns] * rows)
-        for row, col in np.ndindex((rows, columns)):
-            coordinates = (row, col)
-            if cells[coordinates]:
-                delta = 1 if cells[coordinates] else -1
-                for i in range(max(0, row-1), min(row+2, rows)):
-                    for j in range(max(0, col-1), min(col+2, columns)):
-                        if (i, j) != coordinates:
-                            neighbour_count[(i, j)] += delta
-        return neighbour_count
-
-    def __update_neighbour_count(self, updated_cell_coordinates: tuple[int, int]) -> None:
-        """Update the neighbours of the cell with the given coordinates, and update each
-        of their neighbour count values, depending on the value of the given cell"""
-        if updated_cell_coordinates == NUMBA_EMPTY_PLACEHOLDER:
-            return
-
-        delta = 1 if self.__cells[updated_cell_coordinates] else -1
-        ConwayGoLGrid.__perform_update_neighbour_count(self.__neighbour_count,
-                                                       updated_cell_coordinates, delta)
+    def __store_state(self, cells_changed: bool = True) -> None:
+        """Store the current  state of the grid to be able to reverse, before it is changed.
+        Only the most recent backup holds the full, bit-packed state of the grid. Every older
+        backup only holds the 64-bit words in which it differs from the backup that came after
+        it, since only a fraction of the grid changes between two backups.
+        When only the colors change, the next iteration worked out so far remains valid"""
+        if cells_changed:
+            self.__state_version += 1
+            # Any change to the grid can affect every tile, so the next update packs the grid
+            # again and evaluates all of them
+            self.__packed_cells = None
+        state = self.__pack_state()
+        if len(self.__backups) > 0:
+            latest = self.__backups[-1]
+            diff = latest.state.view(np.uint64) ^ state.view(np.uint64)
+            indices = np.flatnonzero(diff).astype(np.uint32)
+            latest.state = StateDiff(indices, diff[indices])
 
-    @staticmethod
-    @njit(fastmath=True, cache=True)
-    def __perform_update_neighbour_count(neighbour_count: np.ndarray,
-                                         updated_cell_coordinates: tuple[int, int],
-                                         delta: int) -> None:
-        rows, columns = neighbour_count.shape
-        row, col = updated_cell_coordinates
-        for i in range(max(0, row-1), min(row+2, rows)):
-            for j in range(max(0, col-1), min(col+2, columns)):
-                if (i, j) != updated_cell_coordinates:
-                    neighbour_count[(i, j)] += delta
-
-    def __store_state(self) -> None:
-        """Store the current  state of the grid to be able to reverse"""
         backup = Settings(self.__background_color, self.__grid_color, self.__new_color,
-                          self.__survivor_color, self.__dead_color, copy(self.__cells),
-                          copy(self.__neighbour_count), copy(self.__new_cells),
-                          copy(self.__survivor_cells), copy(self.__survivor_duration),
-                          copy(self.__dead_cells), self.__iteration, self.__prepared_cells)
+                          self.__survivor_color, self.__dead_color, state, self.__iteration)
         self.__backups.append(backup)
 
-    def __update_survivor_duration(self) -> None:
-        """Update the dictionary holding the lifetime of survivor cells"""
-        # Whatever sits in survivor_duration but not in surivor_cells can be removed
-        # These are cells that might have been blanked out or changed status during update
-        # survivor_cells is the source of truth here
-        _ = [self.__survivor_duration.pop(cell, None)
-                for cell in list(self.__survivor_duration.keys())
-                    if cell not in self.__survivor_cells]
-        # Now add/increment cells from surivor_cells in survivor_duration
-        for survivor in self.__survivor_cells:
-            if survivor in self.__survivor_duration:
-                self.__survivor_duration[survivor] += 1
-            else:
-                self.__survivor_duration[survivor] = 0
+    def __pack_state(self) -> np.ndarray:
+        """Pack the cells, the cell masks and the survivor duration into a single byte array,
+        storing the cells and masks as one bit per cell. Both parts are padded to whole 64-bit
+        words, so the state can be compared word by word and the survivor duration is aligned"""
+        masks = np.stack((self.__cells.view(bool), self.__new_cells, self.__survivor_cells,
+                          self.__dead_cells))
+        mask_bytes = self.__packed_mask_bytes()
+        duration_bytes = -(-self.__survivor_duration.nbytes // 8) * 8
+        state = np.zeros(mask_bytes + duration_bytes, dtype=np.uint8)
+        state[:-(-masks.size // 8)] = np.packbits(masks)
+        duration = self.__survivor_duration.view(np.uint8).ravel()
+        state[mask_bytes:mask_bytes + duration.size] = duration
+        return state
+
+    def __unpack_state(self, state: np.ndarray) -> None:
+        """Restore the cells, the cell masks and the survivor duration from a packed state"""
+        shape = self.__cells.shape
+        masks = np.unpackbits(state, count=4 * self.__cells.size).reshape((4, *shape))
+        self.__cells = masks[0]
+        self.__new_cells = masks[1].view(bool)
+        self.__survivor_cells = masks[2].view(bool)
+        self.__dead_cells = masks[3].view(bool)
+        mask_bytes = self.__packed_mask_bytes()
+        duration = state[mask_bytes:mask_bytes + 2 * self.__cells.size]
+        self.__survivor_duration = duration.view(np.uint16).reshape(shape)
+
+    def __packed_mask_bytes(self) -> int:
+        """The number of bytes the cells and masks take up in a packed state, in whole words"""
+        return -(-4 * self.__cells.size // CELLS_PER_WORD) * 8
+
+    def __update_survivor_duration(self, previous_survivor_cells: np.ndarray) -> None:
+        """Update the grid holding the lifetime of survivor cells"""
+        # Survivors that already survived the previous iteration live on for another one,
+        # fresh survivors start at 0 and every other cell starts over.
+        # Done in place, so no new grid is allocated every iteration. The duration is capped
+        # rather than left to wrap around, so long-lived survivors can still be purged
+        np.minimum(self.__survivor_duration, MAX_SURVIVOR_DURATION - 1,
+                   out=self.__survivor_duration)
+        self.__survivor_duration += previous_survivor_cells
+        self.__survivor_duration *= self.__survivor_cells
 
     def __prepare_cells(self) -> None:
-        """Prepare a cell of each color, so we do not have to do this on the fly while drawing"""
+        """Prepare a cell of each color, so we do not have to do this on the fly while drawing.
+        Prepared cells are shared between grids and kept around in a least recently used cache,
+        so changing colors back and forth or reverting does not redo the bloom effect"""
         self.__prepared_cells = {}
+        bloom_cache = ConwayGoLGrid.__bloom_cache
         for color in [self.__new_color, self.__survivor_color, self.__dead_color]:
-            image = pg.Surface((self.__cell_size.value, self.__cell_size.value), pg.SRCALPHA)
-            pg.draw.rect(image, color, self.__cell_size_settings.cell_rect)
-            bloom_image = self.__add_bloom_effect(image)
-            self.__prepared_cells[color] = bloom_image
+            key = (self.__cell_size, color)
+            if key in bloom_cache:
+                bloom_cache.move_to_end(key)
+            else:
+                image = pg.Surface((self.__cell_size.value, self.__cell_size.value), pg.SRCALPHA)
+                pg.draw.rect(image, color, self.__cell_size_settings.cell_rect)
+                bloom_cache[key] = self.__add_bloom_effect(image)
+                if len(bloom_cache) > MAX_CACHED_BLOOM_CELLS:
+                    bloom_cache.popitem(last=False)
+            self.__prepared_cells[color] = bloom_cache[key]
+
+        self.__solid_cells = {}
+        for color in [self.__background_color, self.__new_color, self.__survivor_color,
+                      self.__dead_color]:
+            image = pg.Surface((self.__cell_size.value, self.__cell_size.value))
+            image.fill(color)
+            self.__solid_cells[color] = image
 
     def __add_bloom_effect(self, cell_rectangle: pg.Surface) -> pg.Surface:
         """Takes the incoming cell rectangle and returns it with a nice bloom effect around it"""
@@ -453,78 +615,108 @@ class ConwayGoLGrid():
         rgb = pg.surfarray.array3d(surf_alpha)
         alpha = pg.surfarray.array_alpha(surf_alpha).reshape((*rgb.shape[:2], 1))
         image = np.concatenate((rgb, alpha), 2)
-        GaussianBlur(image, ksize=self.__cell_size_settings.gaussian_ksize,
-                         sigmaX=10, sigmaY=10, dst=image)
-        blur(image, ksize=self.__cell_size_settings.blur_ksize, dst=image)
-        bloom_cell_rectangle = pg.image.frombuffer(image.flatten(), image.shape[1::-1], 'RGBA')
+        kernel = ConwayGoLGrid.__bloom_kernel(self.__cell_size_settings.gaussian_ksize,
+                                              self.__cell_size_settings.blur_ksize)
+        sepFilter2D(image, -1, kernel, kernel, dst=image)
+        bloom_cell_rectangle = pg.image.frombuffer(image, image.shape[1::-1], 'RGBA')
         return bloom_cell_rectangle
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def __bloom_kernel(gaussian_ksize: tuple[int, int], blur_ksize: tuple[int, int]) -> np.ndarray:
+        """Combine the gaussian blur and the box blur into one separable kernel, so the bloom
+        effect only takes a single pass over the image"""
+        gaussian = getGaussianKernel(gaussian_ksize[0], BLOOM_SIGMA).ravel()
+        box = np.full(blur_ksize[0], 1 / blur_ksize[0])
+        return np.convolve(gaussian, box)
+
     def __draw_grid(self) -> None:
         """Draws the grid"""
         self.__surface.fill(self.__background_color)
+        self.__dirty_rect = self.__surface.get_rect()
         self.__draw_all_cells(self.__gridlines_visible)
-        if self.__gridlines_visible:
-            self.__draw_gridlines()
 
     def __draw_gridlines(self) -> None:
-        """Draws the gridlines"""
-        _ = [pg.draw.line(self.__surface, self.__grid_color, (x, 0), (x, self.__height))
-             for x in range(0, self.__width, self.__cell_size.value)]
-        _ = [pg.draw.line(self.__surface, self.__grid_color, (0, y), (self.__width, y))
-             for y in range(0, self.__height, self.__cell_size.value)]
+        """Draws the gridlines. They are drawn once onto an overlay, which is then blitted
+        onto the grid as a whole"""
+        if self.__gridlines is None:
+            # Everything but the lines is made transparent through a color key, which is
+            # the inverse of the grid color to make sure the two never clash
+            color_key = tuple(255 - value for value in self.__grid_color)
+            self.__gridlines = pg.Surface((self.__width, self.__height))
+            self.__gridlines.fill(color_key)
+            self.__gridlines.set_colorkey(color_key)
+            _ = [pg.draw.line(self.__gridlines, self.__grid_color, (x, 0), (x, self.__height))
+                 for x in range(0, self.__width, self.__cell_size.value)]
+            _ = [pg.draw.line(self.__gridlines, self.__grid_color, (0, y), (self.__width, y))
+                 for y in range(0, self.__height, self.__cell_size.value)]
+        self.__surface.blit(self.__gridlines, (0, 0))
 
     def __draw_all_cells(self, draw_gridlines: bool) -> None:
         """Draws all cells in the grid"""
-        self.__draw_new_cells(False)
-        self.__draw_survivor_cells(False)
-        self.__draw_dead_cells(False)
+        if self.__cell_size in {CellSize.XS, CellSize.S}:
+            self.__paint_all_cells()
+        else:
+            self.__draw_new_cells(False)
+            self.__draw_survivor_cells(False)
+            self.__draw_dead_cells(False)
         if draw_gridlines:
             self.__draw_gridlines()
 
+    def __paint_all_cells(self) -> None:
+        """Paints all cells in one go, by writing the color of every cell to an image holding
+        a pixel per cell, and scaling that up onto the grid. Only for the small cell sizes,
+        which are drawn as solid cells without bloom"""
+        palette = np.array([self.__background_color, self.__new_color, self.__survivor_color,
+                            self.__dead_color], dtype=np.uint8)
+        states = self.__new_cells.view(np.uint8) + 2 * self.__survivor_cells.view(np.uint8)
+        states += 3 * self.__dead_cells.view(np.uint8)
+        pg.surfarray.blit_array(self.__cell_image, palette[states.T])
+        pg.transform.scale(self.__cell_image, self.__cell_area.get_size(), self.__cell_area)
+        rect = self.__cell_area.get_rect()
+        self.__dirty_rect = rect if self.__dirty_rect is None else self.__dirty_rect.union(rect)
+
     def __draw_new_cells(self, draw_gridlines: bool) -> None:
         """Draws the new cells in the grid"""
-        cells_to_redraw = [(i, j, self.__new_color) for i, j in self.__new_cells]
-        self.__draw_cells(cells_to_redraw, draw_gridlines)
+        self.__draw_cells(*np.nonzero(self.__new_cells), self.__new_color, draw_gridlines)
 
     def __draw_survivor_cells(self, draw_gridlines: bool) -> None:
         """Draws the survivor cells in the grid"""
-        cells_to_redraw = [(i, j, self.__survivor_color) for i, j in self.__survivor_cells]
-        self.__draw_cells(cells_to_redraw, draw_gridlines)
+        self.__draw_cells(*np.nonzero(self.__survivor_cells), self.__survivor_color,
+                          draw_gridlines)
 
     def __draw_dead_cells(self, draw_gridlines: bool) -> None:
         """Draws the dead cells in the grid"""
-        cells_to_redraw = [(i, j, self.__dead_color) for i, j in self.__dead_cells]
-        self.__draw_cells(cells_to_redraw, draw_gridlines)
+        self.__draw_cells(*np.nonzero(self.__dead_cells), self.__dead_color, draw_gridlines)
 
-    def __draw_cells(self, cells_to_redraw: list[tuple[int, int, tuple[int, int, int]]],
+    def __draw_cells(self, rows: np.ndarray, columns: np.ndarray, color: tuple[int, int, int],
                      draw_gridlines: bool) -> None:
-        """Draws the given cells in the given color"""
+        """Draws the cells at the given rows and columns in the given color. All cells are
+        handed to pygame in one batch, rather than drawing them one by one"""
+        positions = list(zip(self.__x_coordinates[columns].tolist(),
+                             self.__y_coordinates[rows].tolist()))
+        if len(positions) > 0:
+            # Keep track of the bounding box of all cells drawn, so only that part of the
+            # surface needs to be copied to the screen
+            size = self.__cell_size.value
+            left, top = self.__x_coordinates[columns.min()], self.__y_coordinates[rows.min()]
+            width = self.__x_coordinates[columns.max()] + size - left
+            height = self.__y_coordinates[rows.max()] + size - top
+            rect = pg.Rect(int(left), int(top), int(width), int(height))
+            self.__dirty_rect = rect if self.__dirty_rect is None else self.__dirty_rect.union(rect)
         # For the smallest cell size, we'll not pay the cost of generating rectangles with bloom
         # The viewer wouldn't notice it, and it costs some frames cause of the amount of rectangles
-        draw_function = (self.__simple_draw
-                         if self.__cell_size in {CellSize.XS, CellSize.S}
-                         else self.__bloom_draw)
-        for row, column, color in cells_to_redraw:
-            dimensions = (column * self.__cell_size.value, row * self.__cell_size.value,
-                          self.__cell_size.value, self.__cell_size.value)
-            draw_function(color, dimensions, row, column)
+        if (self.__cell_size in {CellSize.XS, CellSize.S}
+            or color == self.__background_color):
+            cell = self.__solid_cells[color]
+            self.__surface.blits([(cell, position) for position in positions], doreturn=False)
+        else:
+            background = self.__solid_cells[self.__background_color]
+            self.__surface.blits([(background, position) for position in positions],
+                                 doreturn=False)
+            cell = self.__prepared_cells[color]
+            self.__surface.blits([(cell, position, None, pg.BLEND_PREMULTIPLIED)
+                                  for position in positions], doreturn=False)
 
         if draw_gridlines:
             self.__draw_gridlines()
-
-    def __simple_draw(self, color: tuple[int, int, int], dimensions: tuple[int, int, int, int],
-                      _ = None, __ = None):
-        """Stick to drawing a simple rectangle"""
-        pg.draw.rect(self.__surface, color, dimensions)
-
-    def __bloom_draw(self, color: tuple[int, int, int], dimensions: tuple[int, int, int, int],
-                     row: int, column: int):
-        """Draw the rectangle with nice bloom around it"""
-        if color != self.__background_color:
-            pg.draw.rect(self.__surface, self.__background_color, dimensions)
-            cell = self.__prepared_cells[color]
-            rect = cell.get_rect()
-            rect.topleft = (column * self.__cell_size.value, row * self.__cell_size.value)
-            self.__surface.blit(cell, rect, special_flags = pg.BLEND_PREMULTIPLIED)
-        else:
-            pg.draw.rect(self.__surface, color, dimensions)
@@ -20,7 +20,7 @@ can do to interact with the environment:
 * cell size can be changed to a predefined set of sizes
 * target framerate can be changed
 """
-from random import randint, randrange
+from functools import lru_cache
 import pygame as pg
 import numpy as np
 from conwaygolgrid import ConwayGoLGrid, CellSize
@@ -36,12 +36,24 @@ WIDTH, HEIGHT = 1920, 1200
 CELL_SIZES = [CellSize.XS, CellSize.S, CellSize.M, CellSize.L, CellSize.XL]
 DEFAULT_CELL_SIZE = CellSize.M
 GLIDERS_PER_CELL_SIZE = [200, 25, 15, 2, 0]
+GLIDER_SE_ROWS, GLIDER_SE_COLUMNS = np.array([0, 1, 2, 2, 2]), np.array([0, 1, -1, 0, 1])
+GLIDER_NW_ROWS, GLIDER_NW_COLUMNS = np.array([0, -1, 0, 1, -1]), np.array([0, -2, -2, -2, -1])
+GROWTH_LINE_COLUMNS = np.r_[5:13, 14:19, 22:25, 31:38, 39:44]
+GROWTH_ENGINE_ROWS = np.array([0, 0, 0, 0, 1, 2, 2, 3, 3, 3, 4, 4, 4])
+GROWTH_ENGINE_COLUMNS = np.array([0, 1, 2, 4, 0, 3, 4, 1, 2, 4, 0, 2, 4])
+GLIDER_GUN_ROWS = np.array([4, 5, 4, 5, 4, 5, 6, 3, 7, 2, 8, 2, 8, 5, 3, 7, 4, 5,
+                            6, 5, 2, 3, 4, 2, 3, 4, 1, 5, 0, 1, 5, 6, 2, 3, 2, 3])
+GLIDER_GUN_COLUMNS = np.array([0, 0, 1, 1, 10, 10, 10, 11, 11, 12, 12, 13, 13, 14, 15, 15, 16,
+                               16, 16, 17, 20, 20, 20, 21, 21, 21, 22, 22, 24, 24, 24, 24, 34,
+                               34, 35, 35])
 HELP_MENU_DIMENSIONS = (570, 720)
 HELP_MENU_TOPLEFT = (20, 20)
 HELP_MENU_COLOR, HELP_MENU_ALPHA = (150, 150, 150), 200
+STATS_DIMENSIONS = (570, 30)
 STATS_COLOR = (100, 100, 100)
 PURGE_TRIGGER = 100
 MAX_PREVIOUS_GRID_STATES = 50
+RNG = np.random.default_rng()
 HELP_MENU_TEXT = [
     "F1 - toggle this menu",
     "F2 - go fullscreen",
@@ -77,42 +89,48 @@ def initialize(width: int, height: int, cell_size: CellSize
                ) -> tuple[ConwayGoLGrid, pg.Surface, pg.Surface, pg.time.Clock]:
     """Initialize all we need to start running the game"""
     pg.init()
-    pg.event.set_allowed([pg.QUIT, pg.KEYDOWN, pg.MOUSEBUTTONDOWN])
+    pg.event.set_allowed([pg.QUIT, pg.KEYDOWN, pg.MOUSEBUTTONDOWN, pg.WINDOWEXPOSED])
     pg.display.set_caption("Game of Life")
     pg.mouse.set_cursor(pg.SYSTEM_CURSOR_HAND)
-    screen = pg.display.set_mode((width, height), pg.RESIZABLE)
+    screen = pg.display.set_mode((width, height), pg.RESIZABLE | pg.DOUBLEBUF)
     help_menu = create_help_menu()
-    grid = ConwayGoLGrid.new(cell_size, width, height, pg.Surface((width, height)),
+    # Converted to the pixel format of the screen, so copying it there needs no conversion
+    grid = ConwayGoLGrid.new(cell_size, width, height, pg.Surface((width, height)).convert(),
                              DEFAULT_BACKGROUND_COLOR, DEFAULT_GRID_COLOR, DEFAULT_NEW_COLOR,
                              DEFAULT_SURVIVOR_COLOR, DEFAULT_DEAD_COLOR, MAX_PREVIOUS_GRID_STATES)
     return grid, screen, help_menu, pg.time.Clock()
 
 
+@lru_cache(maxsize=None)
+def load_font(size: int, bold: bool = False) -> pg.font.Font:
+    """Load the font used in the game in the given size, only once per size"""
+    font = pg.font.Font(pg.font.match_font("calibri"), size)
+    font.bold = bold
+    return font
+
+
 def create_help_menu() -> pg.Surface:
     """Create the help menu"""
-    help_menu = pg.Surface(HELP_MENU_DIMENSIONS)
+    help_menu = pg.Surface(HELP_MENU_DIMENSIONS).convert()
     help_menu.fill(HELP_MENU_COLOR)
     help_menu.set_alpha(HELP_MENU_ALPHA)
-    font_name = pg.font.match_font("calibri")
-    font = pg.font.Font(font_name, 24)
     text = "How to control the game"
-    text_surface = font.render(text, True, (0, 0, 0))
+    text_surface = load_font(24).render(text, True, (0, 0, 0))
     help_menu.blit(text_surface, (10, 10))
 
+    font = load_font(16)
     for i, text in enumerate(HELP_MENU_TEXT):
-        font = pg.font.Font(font_name, 16)
         text_surface = font.render(text, True, (0, 0, 0))
         help_menu.blit(text_surface, (50, 40 + ((i+1) * 24)))
     return help_menu
 
 
+@lru_cache(maxsize=1)
 def update_stats_display(text: str) -> pg.Surface:
-    """Updates the caption"""
-    stats_display = pg.Surface((570, 30))
+    """Updates the caption. As long as the text stays the same, the previous one is reused"""
+    stats_display = pg.Surface(STATS_DIMENSIONS).convert()
     stats_display.fill(STATS_COLOR)
-    font_name = pg.font.match_font("calibri")
-    font = pg.font.Font(font_name, 14)
-    font.bold = True
+    font = load_font(14, bold=True)
     text_surface = font.render(text, True, (0, 0, 0))
     stats_display.blit(text_surface, (5, 8))
 
@@ -121,143 +139,95 @@ def update_stats_display(text: str) -> pg.Surface:
 
 def load_random_cell_layout(grid: ConwayGoLGrid) -> None:
     """Load up the grid with a random set of live cells"""
-    cells = np.random.choice([False, True], grid.shape, p=[0.93, 0.07])
+    cells = RNG.random(grid.shape, dtype=np.float32) < 0.07
     grid.create_cell_layout(cells)
 
 
+def place_mirrored(cells: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                   mirror_vertically: bool = False) -> None:
+    """Brings the cells at the given positions to life, together with their mirror image
+    left to right, and optionally top to bottom"""
+    height, width = cells.shape
+    rows, cols = np.broadcast_arrays(rows, cols)
+    rows, cols = np.concatenate((rows, rows)), np.concatenate((cols, width - 1 - cols))
+    if mirror_vertically:
+        rows, cols = np.concatenate((rows, height - 1 - rows)), np.concatenate((cols, cols))
+    cells[rows, cols] = True
+
+
 def load_infinite_growth_line(grid: ConwayGoLGrid) -> None:
     """Place an infinitely growing line pattern on the grid"""
-    cells = np.full(grid.shape, False, dtype=bool)
+    cells = np.zeros(grid.shape, dtype=bool)
     rows, _ = grid.shape
     row = rows // 2
-    for col in range(5, 13):
-        cells[row, col] = True
-    for col in range(14, 19):
-        cells[row, col] = True
-    for col in range(22, 25):
-        cells[row, col] = True
-    for col in range(31, 38):
-        cells[row, col] = True
-    for col in range(39, 44):
-        cells[row, col] = True
-    cells = np.logical_or(cells, np.fliplr(cells))
+    place_mirrored(cells, row, GROWTH_LINE_COLUMNS)
     grid.overlay_new_cells(cells, redraw=True)
 
 
 def load_infinite_growth_engine(grid: ConwayGoLGrid) -> None:
     """Place an infinitely growing engine pattern on the grid"""
-    cells = np.full(grid.shape, False, dtype=bool)
+    cells = np.zeros(grid.shape, dtype=bool)
     rows, cols = grid.shape
     row = rows - rows // 4
     col = cols - cols // 4
-    cells[row, col] = True
-    cells[row, col+1] = True
-    cells[row, col+2] = True
-    cells[row, col+4] = True
-    cells[row+1, col] = True
-    cells[row+2, col+3] = True
-    cells[row+2, col+4] = True
-    cells[row+3, col+1] = True
-    cells[row+3, col+2] = True
-    cells[row+3, col+4] = True
-    cells[row+4, col] = True
-    cells[row+4, col+2] = True
-    cells[row+4, col+4] = True
-    cells = np.logical_or(cells, np.fliplr(cells))
-    cells = np.logical_or(cells, np.flipud(cells))
+    place_mirrored(cells, row + GROWTH_ENGINE_ROWS, col + GROWTH_ENGINE_COLUMNS, True)
     grid.overlay_new_cells(cells, redraw=True)
 
 
 def load_gosper_glider_gun(grid: ConwayGoLGrid) -> None:
     """Load up the grid with a Gosper glider gun cross"""
-    cells = np.full(grid.shape, False, dtype=bool)
+    cells = np.zeros(grid.shape, dtype=bool)
     row, col = 6, 6
-    cells[row+4, col] = True
-    cells[row+5, col] = True
-    cells[row+4, col+1] = True
-    cells[row+5, col+1] = True
-    cells[row+4, col+10] = True
-    cells[row+5, col+10] = True
-    cells[row+6, col+10] = True
-    cells[row+3, col+11] = True
-    cells[row+7, col+11] = True
-    cells[row+2, col+12] = True
-    cells[row+8, col+12] = True
-    cells[row+2, col+13] = True
-    cells[row+8, col+13] = True
-    cells[row+5, col+14] = True
-    cells[row+3, col+15] = True
-    cells[row+7, col+15] = True
-    cells[row+4, col+16] = True
-    cells[row+5, col+16] = True
-    cells[row+6, col+16] = True
-    cells[row+5, col+17] = True
-    cells[row+2, col+20] = True
-    cells[row+3, col+20] = True
-    cells[row+4, col+20] = True
-    cells[row+2, col+21] = True
-    cells[row+3, col+21] = True
-    cells[row+4, col+21] = True
-    cells[row+1, col+22] = True
-    cells[row+5, col+22] = True
-    cells[row, col+24] = True
-    cells[row+1, col+24] = True
-    cells[row+5, col+24] = True
-    cells[row+6, col+24] = True
-    cells[row+2, col+34] = True
-    cells[row+3, col+34] = True
-    cells[row+2, col+35] = True
-    cells[row+3, col+35] = True
-    cells = np.logical_or(cells, np.fliplr(cells))
-    cells = np.logical_or(cells, np.flipud(cells))
+    place_mirrored(cells, row + GLIDER_GUN_ROWS, col + GLIDER_GUN_COLUMNS, True)
     grid.overlay_new_cells(cells, redraw=True)
 
 
 def load_diagonal_cross(grid: ConwayGoLGrid) -> None:
     """Load up the grid with a cross through the diagonals"""
-    cells = np.full(grid.shape, False, dtype=bool)
+    cells = np.zeros(grid.shape, dtype=bool)
     rows, cols = grid.shape
-    for row in range((rows // 3), rows - (rows // 3)):
-        cells[row, (row + (cols - rows) // 2)] = True
-        cells[rows - row - 1, (row + (cols - rows) // 2)] = True
+    row = np.arange(rows // 3, rows - rows // 3)
+    col = row + (cols - rows) // 2
+    cells[row, col] = True
+    cells[rows - row - 1, col] = True
     grid.overlay_new_cells(cells, redraw=True)
 
 
-def add_glider_se(cells: np.ndarray, row: int, col: int) -> np.ndarray:
-    """Add South-East facing glider to the grid at the given position"""
-    pos = [(row, col), (row + 1, col + 1), (row - 1, col + 2), (row, col + 2), (row + 1, col + 2)]
-    for i, j in pos:
-        cells[j, i] = True
+def add_glider_se(cells: np.ndarray, row: np.ndarray, col: np.ndarray) -> np.ndarray:
+    """Add South-East facing gliders to the grid at the given positions"""
+    cells[np.add.outer(row, GLIDER_SE_ROWS), np.add.outer(col, GLIDER_SE_COLUMNS)] = True
     return cells
 
 
-def add_glider_nw(cells: np.ndarray, row: int, col: int) -> np.ndarray:
-    """Add North-West facing glider to the grid at the given position"""
-    pos = [(row, col), (row - 2, col - 1), (row - 2, col), (row - 2, col + 1), (row - 1, col - 1)]
-    for i, j in pos:
-        cells[j, i] = True
+def add_glider_nw(cells: np.ndarray, row: np.ndarray, col: np.ndarray) -> np.ndarray:
+    """Add North-West facing gliders to the grid at the given positions"""
+    cells[np.add.outer(row, GLIDER_NW_ROWS), np.add.outer(col, GLIDER_NW_COLUMNS)] = True
     return cells
 
 
 def load_glider_armies(grid: ConwayGoLGrid) -> None:
     """Draw 2 opposing glider armies on the grid"""
     rows, cols = grid.shape
-    cells = np.full(grid.shape, False, dtype=bool)
+    cells = np.zeros(grid.shape, dtype=bool)
     index = CELL_SIZES.index(grid.cell_size)
     gliders = GLIDERS_PER_CELL_SIZE[index]
-    for _ in range(gliders):
-        i, j = (randrange(grid.cell_size.value, cols // 2 + cols // 4, grid.cell_size.value),
-                  randrange(grid.cell_size.value, rows // 2))
-        cells = add_glider_se(cells, i, j)
-        i, j = (randrange(cols // 2 - cols // 4, cols - grid.cell_size.value),
-                randrange(rows // 2, rows - grid.cell_size.value))
-        cells = add_glider_nw(cells, i, j)
+    size = grid.cell_size.value
+    row = RNG.integers(size, rows // 2, gliders)
+    col = RNG.choice(np.arange(size, cols // 2 + cols // 4, size), gliders)
+    cells = add_glider_se(cells, row, col)
+    row = RNG.integers(rows // 2, rows - size, gliders)
+    col = RNG.integers(cols // 2 - cols // 4, cols - size, gliders)
+    cells = add_glider_nw(cells, row, col)
     grid.overlay_new_cells(cells, redraw=True)
 
 
 def lifewave(grid: ConwayGoLGrid, running: bool) -> None:
     """Send a wave of random live cells to the grid"""
-    cells = np.random.choice([False, True], grid.shape, p=[0.97, 0.03])
+    # Only a small fraction of the cells come to life, so draw their positions directly instead
+    # of a random number for every cell in the grid
+    cells = np.zeros(grid.shape, dtype=bool)
+    size = cells.size
+    cells.reshape(-1)[RNG.choice(size, RNG.binomial(size, 0.03), replace=False)] = True
     grid.overlay_new_cells(cells, not running)
 
 
@@ -271,6 +241,11 @@ def change_grid_size(grid: ConwayGoLGrid, direction: int) -> None:
     grid.change_cell_size(CELL_SIZES[index + direction])
 
 
+def random_colors(count: int) -> list[tuple[int, int, int]]:
+    """Draws the given number of random colors at once"""
+    return [tuple(color) for color in RNG.integers(0, 256, (count, 3)).tolist()]
+
+
 def reset_colors(grid: ConwayGoLGrid) -> None:
     """Resets the grid colors to their default values"""
     grid.change_new_color(DEFAULT_NEW_COLOR)
@@ -279,12 +254,15 @@ def reset_colors(grid: ConwayGoLGrid) -> None:
 
 
 def handle_events(grid: ConwayGoLGrid, running: bool, draw_menu: bool,
-                  draw_stats: bool, fps: int) -> tuple[bool, bool, bool, bool, int]:
+                  draw_stats: bool, fps: int) -> tuple[bool, bool, bool, bool, int, bool]:
     """Handling the PyGame events in the main loop"""
+    refresh_screen = False
     for event in pg.event.get():
         match event.type:
             case pg.QUIT:
-                return False, False, False, True, fps
+                return False, False, False, True, fps, refresh_screen
+            case pg.WINDOWEXPOSED:
+                refresh_screen = True
             case pg.MOUSEBUTTONDOWN:
                 change = 5 if fps < 30 else 10
                 if event.button == 4:
@@ -294,10 +272,14 @@ def handle_events(grid: ConwayGoLGrid, running: bool, draw_menu: bool,
             case pg.KEYDOWN:
                 match event.key:
                     case pg.K_F1: draw_menu = not draw_menu
-                    case pg.K_F2: pg.display.set_mode((WIDTH, HEIGHT), pg.FULLSCREEN)
-                    case pg.K_F3: pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE)
+                    case pg.K_F2:
+                        pg.display.set_mode((WIDTH, HEIGHT), pg.FULLSCREEN | pg.DOUBLEBUF)
+                        refresh_screen = True
+                    case pg.K_F3:
+                        pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE | pg.DOUBLEBUF)
+                        refresh_screen = True
                     case pg.K_F4: draw_stats = not draw_stats
-                    case pg.K_q: return False, False, False, True, fps
+                    case pg.K_q: return False, False, False, True, fps, refresh_screen
                     case pg.K_SPACE: running = not running
                     case pg.K_RETURN | pg.K_KP_ENTER:
                         running = False
@@ -313,16 +295,10 @@ def handle_events(grid: ConwayGoLGrid, running: bool, draw_menu: bool,
                     case pg.K_w:
                         if not running:
                             grid.reverse()
-                    case pg.K_n:
-                        grid.change_new_color((randint(0,255), randint(0,255), randint(0,255)))
-                    case pg.K_s:
-                        grid.change_survivor_color((randint(0,255), randint(0,255), randint(0,255)))
-                    case pg.K_d:
-                        grid.change_dead_color((randint(0,255), randint(0,255), randint(0,255)))
-                    case pg.K_a:
-                        grid.change_all_colors(((randint(0,255), randint(0,255), randint(0,255)),
-                                                (randint(0,255), randint(0,255), randint(0,255)),
-                                                (randint(0,255), randint(0,255), randint(0,255))))
+                    case pg.K_n: grid.change_new_color(random_colors(1)[0])
+                    case pg.K_s: grid.change_survivor_color(random_colors(1)[0])
+                    case pg.K_d: grid.change_dead_color(random_colors(1)[0])
+                    case pg.K_a: grid.change_all_colors(tuple(random_colors(3)))
                     case pg.K_r: reset_colors(grid)
                     case pg.K_g: grid.toggle_grid_lines()
                     case pg.K_UP: change_grid_size(grid, 1)
@@ -341,39 +317,41 @@ def handle_events(grid: ConwayGoLGrid, running: bool, draw_menu: bool,
                         if grid.cell_size != CellSize.XL:
                             load_glider_armies(grid)
 
+    mouse_button = pg.mouse.get_pressed()
+    if mouse_button[0] or mouse_button[2]:
+        mouse_position = pg.mouse.get_pos()
+        size = grid.cell_size.value
+        coordinates = (mouse_position[1] // size, mouse_position[0] // size)
+        if mouse_button[0]:
+            grid.resurrect_cell(coordinates)
+        else:
+            grid.clear_cell(coordinates)
 
-        mouse_button = pg.mouse.get_pressed()
-        if mouse_button[0] or mouse_button[2]:
-            mouse_position = pg.mouse.get_pos()
-            coordinates = (mouse_position[1] // grid.cell_size.value,
-                           mouse_position[0] // grid.cell_size.value)
-            if mouse_button[0]:
-                grid.resurrect_cell(coordinates)
-            else:
-                grid.clear_cell(coordinates)
+    return running, draw_menu, draw_stats, False, fps, refresh_screen
 
-    return running, draw_menu, draw_stats, False, fps
 
-
-def draw_surfaces(screen: pg.Surface, grid: pg.Surface, help_menu: pg.Surface,
-                  draw_menu: bool, draw_stats: bool, stats_text: str) -> None:
-    """Draws all surfaces to the screen"""
+def draw_surfaces(screen: pg.Surface, grid: pg.Surface, grid_rect: pg.Rect | None,
+                  help_menu: pg.Surface, draw_menu: bool, draw_stats: bool,
+                  stats_text: str) -> list[pg.Rect]:
+    """Draws all surfaces to the screen, and returns the areas of the screen that changed"""
     screen_rect = screen.get_rect()
-    screen.set_clip(screen_rect)
-    screen.blit(grid, screen_rect)
-
+    menu_rect = help_menu.get_rect()
+    menu_rect.topleft = HELP_MENU_TOPLEFT
+    stats_rect = pg.Rect((0, 0), STATS_DIMENSIONS)
+    stats_rect.topleft = (5, screen_rect.height - stats_rect.height - 5)
+    # Only the part of the grid that changed is copied to the screen. The grid beneath the menu
+    # and the stats is always copied as well, since those are drawn on top of it every frame,
+    # or have to disappear from the screen when toggled off
+    dirty_rects = [rect for rect in [grid_rect, menu_rect, stats_rect] if rect is not None]
+    blit_sequence = [(grid, rect, rect) for rect in dirty_rects]
     if draw_menu:
-        menu_rect = help_menu.get_rect()
-        menu_rect.topleft = HELP_MENU_TOPLEFT
-        screen.set_clip(menu_rect)
-        screen.blit(help_menu, menu_rect)
+        blit_sequence.append((help_menu, menu_rect))
 
     if draw_stats:
-        stats = update_stats_display(stats_text)
-        stats_rect = stats.get_rect()
-        stats_rect.topleft = (5, screen_rect.height - stats_rect.height - 5)
-        screen.set_clip(stats_rect)
-        screen.blit(stats, stats_rect)
+        blit_sequence.append((update_stats_display(stats_text), stats_rect))
+
+    screen.blits(blit_sequence, doreturn=False)
+    return dirty_rects
 
 
 def main():
@@ -385,7 +363,7 @@ def main():
     draw_stats = True
     while True:
         (running, draw_menu, draw_stats, exit_program,
-         fps) = handle_events(grid, running, draw_menu, draw_stats, fps)
+         fps, refresh_screen) = handle_events(grid, running, draw_menu, draw_stats, fps)
 
         if exit_program:
             pg.quit()
@@ -395,12 +373,19 @@ def main():
             grid.update()
             clock.tick(fps)
 
-        stats_text = (f"actual/target fps: {int(clock.get_fps())}/{fps}" +
-                      f" - cell size: {grid.cell_size.value}x{grid.cell_size.value}" +
-                      f" - iteration: {grid.iteration}" +
-                      f" - alive cells: {grid.alive_count} ({grid.alive_percentage:.1f}%)")
-        draw_surfaces(screen, grid.surface, help_menu, draw_menu, draw_stats, stats_text)
-        pg.display.flip()
+        stats_text = ""
+        if draw_stats:
+            size = grid.cell_size.value
+            stats_text = (f"actual/target fps: {int(clock.get_fps())}/{fps}" +
+                          f" - cell size: {size}x{size}" +
+                          f" - iteration: {grid.iteration}" +
+                          f" - alive cells: {grid.alive_count} ({grid.alive_percentage:.1f}%)")
+        grid_rect = grid.take_dirty_rect()
+        if refresh_screen:
+            grid_rect = screen.get_rect()
+        dirty_rects = draw_surfaces(screen, grid.surface, grid_rect, help_menu, draw_menu,
+                                    draw_stats, stats_text)
+        pg.display.update(dirty_rects)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@
 import numpy as np
 import pygame as pg
 from line_profiler import LineProfiler
+import conwaygolgrid
 from conwaygolgrid import ConwayGoLGrid, CellSize
 
 background_color = (5, 5, 5)
@@ -30,19 +31,19 @@ def update_screen(grid: ConwayGoLGrid, screen: pg.Surface) -> None:
     pg.display.flip()
 
 
-def profile_update(grid: ConwayGoLGrid, screen: pg.Surface, file) -> None:
+def profile_update(grid: ConwayGoLGrid, screen: pg.Surface, cells: np.ndarray, file) -> None:
     """Profile the perform_update function"""
     profiler = LineProfiler()
+    # The work is done by the private implementation behind perform_update, which gets
+    # registered along with the rest of the grid module. Only the functions that ran are listed
+    profiler.add_module(conwaygolgrid)
 
-    wrapped = profiler(grid._ConwayGoLGrid__perform_update)
-    wrapped(grid._ConwayGoLGrid__cells, grid._ConwayGoLGrid__neighbour_count,
-            grid._ConwayGoLGrid__new_cells, grid._ConwayGoLGrid__survivor_cells,
-            grid._ConwayGoLGrid__dead_cells, new_color, survivor_color,
-            dead_color, background_color)
+    wrapped = profiler(ConwayGoLGrid.perform_update)
+    wrapped(cells)
 
     update_screen(grid, screen)
 
-    profiler.print_stats(file)
+    profiler.print_stats(file, stripzeros=True)
 
 
 def main() -> None:
@@ -56,7 +57,7 @@ def main() -> None:
         update_screen(grid, screen)
 
         with open(file_name, mode="w", encoding="utf-8") as output_file:
-            profile_update(grid, screen, output_file)
+            profile_update(grid, screen, cells, output_file)
             pg.quit()
             print(f"Output written to {file_name}")
     except IOError:
@@ -0,0 +1,14 @@
+"""Shared fixtures for the tests"""
+import os
+import pytest
+import pygame as pg
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+
+@pytest.fixture(scope="session")
+def screen() -> pg.Surface:
+    """A display to draw onto, the grid needs one to convert its prepared cells"""
+    pg.init()
+    yield pg.display.set_mode((240, 120))
+    pg.quit()
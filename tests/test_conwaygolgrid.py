@@ -0,0 +1,194 @@
+"""Tests for the grid"""
+import numpy as np
+import pygame as pg
+import pytest
+from conwaygolgrid import ConwayGoLGrid, CellSize
+
+
+def create_grid(screen: pg.Surface, cell_size: CellSize, max_backups: int = 10
+                ) -> ConwayGoLGrid:
+    """Create a grid covering the whole screen"""
+    width, height = screen.get_size()
+    return ConwayGoLGrid.new(cell_size, width, height, pg.Surface((width, height)), (0, 0, 0),
+                             (15, 15, 15), (40, 100, 40), (80, 120, 60), (60, 10, 15),
+                             max_backups)
+
+
+def next_generation(cells: np.ndarray) -> np.ndarray:
+    """Straightforward implementation of Conway's Game of Life rules"""
+    padded = np.pad(cells, 1).astype(np.uint8)
+    rows, columns = cells.shape
+    neighbours = sum(padded[1+row:1+row+rows, 1+col:1+col+columns]
+                     for row in (-1, 0, 1) for col in (-1, 0, 1) if (row, col) != (0, 0))
+    return (neighbours == 3) | (cells & (neighbours == 2))
+
+
+def grid_cells(grid: ConwayGoLGrid) -> np.ndarray:
+    """A copy of the alive cells of the grid"""
+    return grid._ConwayGoLGrid__cells.astype(bool)
+
+
+def grid_state(grid: ConwayGoLGrid) -> tuple:
+    """A copy of everything a backup of the grid restores"""
+    arrays = tuple(getattr(grid, f"_ConwayGoLGrid__{name}").copy()
+                   for name in ("cells", "new_cells", "survivor_cells", "dead_cells",
+                                "survivor_duration"))
+    colors = tuple(getattr(grid, f"_ConwayGoLGrid__{name}")
+                   for name in ("background_color", "grid_color", "new_color",
+                                "survivor_color", "dead_color"))
+    return arrays, colors, grid.iteration, grid.alive_count
+
+
+def assert_same_state(state: tuple, expected: tuple):
+    """Assert that two states taken with grid_state are the same"""
+    arrays, *rest = state
+    expected_arrays, *expected_rest = expected
+    for array, expected_array in zip(arrays, expected_arrays):
+        assert np.array_equal(array, expected_array)
+    assert rest == expected_rest
+
+
+def random_color(rng: np.random.Generator) -> tuple[int, int, int]:
+    """A random color"""
+    return tuple(int(value) for value in rng.integers(256, size=3))
+
+
+# Changes that each store a single backup
+EDITS = [
+    lambda grid, rng: grid.update(),
+    lambda grid, rng: grid.resurrect_cell(tuple(np.argwhere(~grid_cells(grid))[0])),
+    lambda grid, rng: grid.update(),
+    lambda grid, rng: grid.change_new_color(random_color(rng)),
+    lambda grid, rng: grid.clear_cell(tuple(np.argwhere(grid_cells(grid))[-1])),
+    lambda grid, rng: grid.update(),
+    lambda grid, rng: grid.overlay_new_cells(rng.random(grid.shape) < 0.05, True),
+    lambda grid, rng: grid.change_all_colors(tuple(random_color(rng) for _ in range(3))),
+    lambda grid, rng: grid.update(),
+    lambda grid, rng: grid.purge_survivors(1),
+    lambda grid, rng: grid.invert(),
+    lambda grid, rng: grid.change_dead_color(random_color(rng)),
+]
+
+
+@pytest.mark.parametrize("iterations", [1, 2, 3, 5, 8])
+def test_purge_survivors_after_unchanged_iterations(screen: pg.Surface, iterations: int):
+    """Survivors are purged once they kept their status for the purge trigger, counting
+    from the iteration they first survived in"""
+    purge_trigger = 3
+    grid = create_grid(screen, CellSize.S)
+    cells = np.random.default_rng(iterations).random(grid.shape) < 0.3
+    grid.create_cell_layout(cells)
+    # Every survivor starts at 0, and counts up for each iteration it survives again
+    survivor_duration = {}
+    for _ in range(iterations):
+        grid.update()
+        updated_cells = next_generation(cells)
+        survivors = set(zip(*np.nonzero(cells & updated_cells)))
+        survivor_duration = {cell: survivor_duration[cell] + 1 if cell in survivor_duration
+                             else 0 for cell in survivors}
+        cells = updated_cells
+
+    purged_count = sum(1 for duration in survivor_duration.values()
+                       if duration >= purge_trigger)
+    grid.purge_survivors(purge_trigger)
+    assert grid.alive_count == np.count_nonzero(cells) - purged_count
+
+
+def test_change_all_colors_marks_surface_dirty(screen: pg.Surface):
+    """Changing all colors repaints every cell, so the grid has to reach the screen"""
+    grid = create_grid(screen, CellSize.XS)
+    grid.create_cell_layout(np.random.default_rng(0).random(grid.shape) < 0.3)
+    grid.take_dirty_rect()
+    grid.change_all_colors(((1, 2, 3), (4, 5, 6), (7, 8, 9)))
+    assert grid.take_dirty_rect() == grid.surface.get_rect()
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (5, 7), (2, 129), (17, 64), (33, 65), (40, 130)])
+def test_chained_packed_updates_follow_rules(shape: tuple[int, int]):
+    """Passing the packed grid on from one update to the next follows the rules, also when
+    the columns do not fill the last word and the rows do not fill the last tile"""
+    perform_update = ConwayGoLGrid._ConwayGoLGrid__perform_update
+    rng = np.random.default_rng(shape[0] * shape[1])
+    cells = (rng.random(shape) < 0.3).astype(np.uint8)
+    packed_cells = None
+    for _ in range(60):
+        expected = next_generation(cells.view(bool))
+        alive = cells.view(bool)
+        cells, new_cells, survivor_cells, dead_cells, packed_cells = perform_update(
+            cells, packed_cells)
+        assert np.array_equal(cells.view(bool), expected)
+        assert np.array_equal(new_cells, expected & ~alive)
+        assert np.array_equal(survivor_cells, expected & alive)
+        assert np.array_equal(dead_cells, alive & ~expected)
+
+
+def test_updates_follow_rules_around_edits(screen: pg.Surface):
+    """Editing the grid in between updates throws away the packed grid, after which the
+    updates still follow the rules"""
+    grid = create_grid(screen, CellSize.XS)
+    rng = np.random.default_rng(0)
+    grid.create_cell_layout(rng.random(grid.shape) < 0.3)
+    for iteration in range(60):
+        cells = grid_cells(grid)
+        if iteration % 4 == 1:
+            grid.resurrect_cell(tuple(rng.integers(grid.shape)))
+        elif iteration % 4 == 2:
+            grid.clear_cell(tuple(np.argwhere(cells)[0]))
+        elif iteration % 4 == 3:
+            grid.overlay_new_cells(rng.random(grid.shape) < 0.05, False)
+        expected = next_generation(grid_cells(grid))
+        grid.update()
+        assert np.array_equal(grid_cells(grid), expected)
+
+
+@pytest.mark.parametrize("max_backups", [1, 10])
+def test_reverse_restores_every_backed_up_state(screen: pg.Surface, max_backups: int):
+    """Reversing step by step restores the states the grid went through, from the packed
+    backup and the word diffs, until the oldest backup the grid kept"""
+    grid = create_grid(screen, CellSize.S, max_backups)
+    rng = np.random.default_rng(max_backups)
+    grid.create_cell_layout(rng.random(grid.shape) < 0.3)
+    states = []
+    for step in range(2 * len(EDITS)):
+        states.append(grid_state(grid))
+        EDITS[step % len(EDITS)](grid, rng)
+
+    for state in reversed(states[-max_backups:]):
+        grid.reverse()
+        assert_same_state(grid_state(grid), state)
+    # Older backups were dropped, so there's nothing left to reverse to
+    grid.reverse()
+    assert_same_state(grid_state(grid), states[-max_backups])
+
+
+def test_update_after_edits_ignores_prefetched_iteration(screen: pg.Surface):
+    """Changing the cells after an update invalidates the iteration worked out in the
+    background, even when a reverse undoes part of the changes"""
+    grid = create_grid(screen, CellSize.XS)
+    rng = np.random.default_rng(0)
+    grid.create_cell_layout(rng.random(grid.shape) < 0.3)
+    grid.update()
+    grid.resurrect_cell(tuple(np.argwhere(~grid_cells(grid))[0]))
+    grid.overlay_new_cells(rng.random(grid.shape) < 0.05, False)
+    grid.reverse()
+    expected = next_generation(grid_cells(grid))
+    grid.update()
+    assert np.array_equal(grid_cells(grid), expected)
+
+
+def test_color_change_keeps_prefetched_iteration(screen: pg.Surface):
+    """Changing only the colors leaves the cells alone, so the iteration worked out in the
+    background can still be used"""
+    grid = create_grid(screen, CellSize.XS)
+    grid.create_cell_layout(np.random.default_rng(0).random(grid.shape) < 0.3)
+    grid.update()
+    state_version = grid._ConwayGoLGrid__state_version
+    next_update = grid._ConwayGoLGrid__next_update
+    grid.change_all_colors(((1, 2, 3), (4, 5, 6), (7, 8, 9)))
+    assert grid._ConwayGoLGrid__state_version == state_version
+    assert grid._ConwayGoLGrid__next_update is next_update
+
+    expected = next_generation(grid_cells(grid))
+    prefetched_update = grid._ConwayGoLGrid__take_next_update()
+    assert prefetched_update is not None
+    assert np.array_equal(prefetched_update[0].view(bool), expected)